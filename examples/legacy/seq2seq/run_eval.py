@@ -131,7 +131,8 @@ def run_generate(verbose=True):
     parsed_args = parse_numeric_n_bool_cl_kwargs(rest)
     if parsed_args and verbose:
         print(f"parsed the following generate kwargs: {parsed_args}")
-    examples = [" " + x.rstrip() if "t5" in args.model_name else x.rstrip() for x in open(args.input_path).readlines()]
+    with open(args.input_path) as f:
+        examples = [" " + x.rstrip() if "t5" in args.model_name else x.rstrip() for x in f]
     if args.n_obs > 0:
         examples = examples[: args.n_obs]
     Path(args.save_path).parent.mkdir(exist_ok=True)
@@ -160,8 +161,10 @@ def run_generate(verbose=True):
 
     # Compute scores
     score_fn = calculate_bleu if "translation" in args.task else calculate_rouge
-    output_lns = [x.rstrip() for x in open(args.save_path).readlines()]
-    reference_lns = [x.rstrip() for x in open(args.reference_path).readlines()][: len(output_lns)]
+    with open(args.save_path) as f:
+        output_lns = [x.rstrip() for x in f]
+    with open(args.reference_path) as f:
+        reference_lns = [x.rstrip() for x in f][: len(output_lns)]
     scores: dict = score_fn(output_lns, reference_lns)
     scores.update(runtime_metrics)
 
@@ -174,7 +177,8 @@ def run_generate(verbose=True):
         print(scores)
 
     if args.score_path is not None:
-        json.dump(scores, open(args.score_path, "w"))
+        with open(args.score_path, "w") as f:
+            json.dump(scores, f)
 
     return scores
 
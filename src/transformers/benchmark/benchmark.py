@@ -18,8 +18,10 @@
 """
 
 
+import contextlib
+import functools
 import timeit
-from typing import Callable, Optional
+from typing import Callable, ContextManager, Dict, Optional, Tuple
 
 from ..configuration_utils import PretrainedConfig
 from ..models.auto.modeling_auto import MODEL_MAPPING, MODEL_WITH_LM_HEAD_MAPPING
@@ -37,6 +39,7 @@ from .benchmark_utils import (
 if is_torch_available():
     import torch
 
+    from ..pytorch_utils import is_torch_greater_or_equal_than_2_0
     from .benchmark_args import PyTorchBenchmarkArguments
 
 
@@ -52,140 +55,238 @@ class PyTorchBenchmark(Benchmark):
     configs: PretrainedConfig
     framework: str = "PyTorch"
 
+    def __init__(self, args: PyTorchBenchmarkArguments = None, configs: PretrainedConfig = None):
+        super().__init__(args=args, configs=configs)
+        # last created model, reused as long as the same model is benchmarked in the same mode
+        self._cached_model_key = None
+        self._cached_model = None
+
     @property
     def framework_version(self):
         return torch.__version__
 
+    def _create_model(self, config: PretrainedConfig, model_mapping) -> "torch.nn.Module":
+        has_model_class_in_config = (
+            hasattr(config, "architectures")
+            and isinstance(config.architectures, list)
+            and len(config.architectures) > 0
+        )
+        if not self.args.only_pretrain_model and has_model_class_in_config:
+            try:
+                model_class = config.architectures[0]
+                transformers_module = __import__("transformers", fromlist=[model_class])
+                model_cls = getattr(transformers_module, model_class)
+                model = model_cls(config)
+            except ImportError:
+                raise ImportError(
+                    f"{model_class} does not exist. If you just want to test the pretrained model, you might want to"
+                    " set `--only_pretrain_model` or `args.only_pretrain_model=True`."
+                )
+        else:
+            model = model_mapping[config.__class__](config)
+        return model
+
+    def _get_model(self, model_name: str, config: PretrainedConfig, training: bool) -> "torch.nn.Module":
+        model_mapping = MODEL_WITH_LM_HEAD_MAPPING if training else MODEL_MAPPING
+        if self.args.do_multi_processing:
+            # every measurement runs in a new process, a cached model would never be reused
+            return self._create_model(config, model_mapping)
+
+        # Only a single model is kept: memory is measured for the whole process (cpu) or device (gpu), so a model
+        # kept alive for another mode or model name would be included in the measured memory.
+        key = (model_name, training)
+        if self._cached_model_key != key:
+            self._cached_model_key = self._cached_model = None
+            if self.args.is_gpu and self.args.device.type == "cuda":
+                torch.cuda.empty_cache()
+            self._cached_model = self._create_model(config, model_mapping)
+            self._cached_model_key = key
+
+        model = self._cached_model
+        # gradients of a previous training measurement must not be part of the next one
+        model.zero_grad(set_to_none=True)
+        return model
+
+    def _get_autocast_fn(self, cache_enabled: Optional[bool] = True) -> Callable[[], ContextManager]:
+        # `self.args` properties go through `requires_backends`, so they are resolved once instead of at every call
+        if not self.args.use_amp:
+            return contextlib.nullcontext
+        return functools.partial(
+            torch.autocast,
+            device_type=self.args.device.type,
+            dtype=self.args.amp_dtype,
+            cache_enabled=cache_enabled,
+        )
+
+    def _get_synchronize_fn(self) -> Callable[[], None]:
+        device_type = self.args.device.type
+        if device_type == "cuda":
+            return torch.cuda.synchronize
+        elif device_type == "xpu":
+            return torch.xpu.synchronize
+        return lambda: None
+
+    def _compile_model(self, model):
+        if not is_torch_greater_or_equal_than_2_0:
+            logger.warning("`torch.compile` requires torch>=2.0, falling back to eager mode.")
+            return model
+        return torch.compile(model, mode=self.args.torch_compile_mode)
+
+    def _jit_optimize_model(self, model, example_inputs: Dict[str, "torch.Tensor"]):
+        if not is_torch_greater_or_equal_than_2_0:
+            logger.warning("PyTorch jit mode requires torch>=2.0, falling back to eager mode.")
+            return model
+
+        try:
+            with self._get_autocast_fn(cache_enabled=False)(), torch.no_grad():
+                jit_model = torch.jit.trace(model, example_kwarg_inputs=example_inputs, strict=False)
+                jit_model = torch.jit.optimize_for_inference(jit_model)
+                # the first calls run the profiling passes of the jit executor
+                jit_model(**example_inputs)
+                jit_model(**example_inputs)
+        except (RuntimeError, TypeError, ValueError, NameError, IndexError) as e:
+            logger.warning(f"failed to use PyTorch jit mode due to: {e}.")
+            return model
+
+        return jit_model
+
     def _inference_speed(self, model_name: str, batch_size: int, sequence_length: int) -> float:
-        _inference = self._prepare_inference_func(model_name, batch_size, sequence_length)
-        return self._measure_speed(_inference)
+        _inference, compiled = self._prepare_inference_func(model_name, batch_size, sequence_length)
+        return self._measure_speed(_inference, compiled=compiled)
 
     def _inference_memory(
         self, model_name: str, batch_size: int, sequence_length: int
     ) -> [Memory, Optional[MemorySummary]]:
-        _inference = self._prepare_inference_func(model_name, batch_size, sequence_length)
+        _inference, _ = self._prepare_inference_func(model_name, batch_size, sequence_length)
         return self._measure_memory(_inference)
 
     def _train_speed(self, model_name: str, batch_size: int, sequence_length: int) -> float:
-        _train = self._prepare_train_func(model_name, batch_size, sequence_length)
-        return self._measure_speed(_train)
+        _train, compiled = self._prepare_train_func(model_name, batch_size, sequence_length)
+        return self._measure_speed(_train, compiled=compiled)
 
     def _train_memory(
         self, model_name: str, batch_size: int, sequence_length: int
     ) -> [Memory, Optional[MemorySummary]]:
-        _train = self._prepare_train_func(model_name, batch_size, sequence_length)
+        _train, _ = self._prepare_train_func(model_name, batch_size, sequence_length)
         return self._measure_memory(_train)
 
-    def _prepare_inference_func(self, model_name: str, batch_size: int, sequence_length: int) -> Callable[[], None]:
+    def _prepare_inference_func(
+        self, model_name: str, batch_size: int, sequence_length: int
+    ) -> Tuple[Callable[[], None], bool]:
+        # also returns whether the model was compiled with `torch.compile`, which changes how it is warmed up
         config = self.config_dict[model_name]
+        device = self.args.device
+        autocast = self._get_autocast_fn()
 
         if self.args.torchscript:
             config.torchscript = True
 
-        has_model_class_in_config = (
-            hasattr(config, "architectures")
-            and isinstance(config.architectures, list)
-            and len(config.architectures) > 0
-        )
-        if not self.args.only_pretrain_model and has_model_class_in_config:
-            try:
-                model_class = config.architectures[0]
-                transformers_module = __import__("transformers", fromlist=[model_class])
-                model_cls = getattr(transformers_module, model_class)
-                model = model_cls(config)
-            except ImportError:
-                raise ImportError(
-                    f"{model_class} does not exist. If you just want to test the pretrained model, you might want to"
-                    " set `--only_pretrain_model` or `args.only_pretrain_model=True`."
-                )
-        else:
-            model = MODEL_MAPPING[config.__class__](config)
+        model = self._get_model(model_name, config, training=False)
 
         model.eval()
-        model.to(self.args.device)
+        model.to(device)
 
         # encoder-decoder has vocab size saved differently
         vocab_size = config.vocab_size if hasattr(config, "vocab_size") else config.encoder.vocab_size
-        input_ids = torch.randint(vocab_size, (batch_size, sequence_length), dtype=torch.long, device=self.args.device)
+        input_ids_dtype = torch.int32 if self.args.int32_input_ids else torch.long
+        input_ids = torch.randint(vocab_size, (batch_size, sequence_length), dtype=input_ids_dtype, device=device)
 
-        if self.args.fp16:
-            logger.info("Running training in Mixed Precision...")
+        if self.args.use_amp:
+            logger.info("Running inference in Mixed Precision...")
             if not self.args.is_gpu:
                 raise ValueError("Mixed precision is possible only for GPU.")
-            # amp seems to have memory leaks so that memory usage
-            # is measured using .half() for now https://github.com/NVIDIA/apex/issues/439
-            model.half()
 
+        if self.args.time_encoder_separately and (self.args.torchscript or self.args.jit_mode):
+            raise ValueError("`time_encoder_separately` cannot be used with `torchscript` or `jit_mode`.")
+
+        compiled = False
         if self.args.torchscript:
             with torch.no_grad():
                 inference_model = torch.jit.trace(model, input_ids)
+        elif self.args.jit_mode:
+            example_inputs = {"input_ids": input_ids}
+            if config.is_encoder_decoder:
+                example_inputs["decoder_input_ids"] = input_ids
+            inference_model = self._jit_optimize_model(model, example_inputs)
+        elif self.args.torch_compile_mode is not None:
+            inference_model = self._compile_model(model)
+            compiled = inference_model is not model
         else:
             inference_model = model
 
         def encoder_decoder_forward():
-            with torch.no_grad():
+            with torch.inference_mode(), autocast():
                 outputs = inference_model(input_ids, decoder_input_ids=input_ids)
             return outputs
 
         def encoder_forward():
-            with torch.no_grad():
+            with torch.inference_mode(), autocast():
                 outputs = inference_model(input_ids)
             return outputs
 
+        if config.is_encoder_decoder and self.args.time_encoder_separately:
+            with torch.inference_mode(), autocast():
+                encoder_outputs = model.get_encoder()(input_ids)
+
+            def decoder_forward():
+                with torch.inference_mode(), autocast():
+                    outputs = inference_model(decoder_input_ids=input_ids, encoder_outputs=encoder_outputs)
+                return outputs
+
+            return decoder_forward, compiled
+
         _forward = encoder_decoder_forward if config.is_encoder_decoder else encoder_forward
-        return _forward
+        return _forward, compiled
 
-    def _prepare_train_func(self, model_name: str, batch_size: int, sequence_length: int) -> Callable[[], None]:
+    def _prepare_train_func(
+        self, model_name: str, batch_size: int, sequence_length: int
+    ) -> Tuple[Callable[[], None], bool]:
+        # also returns whether the model was compiled with `torch.compile`, which changes how it is warmed up
         config = self.config_dict[model_name]
-
-        has_model_class_in_config = (
-            hasattr(config, "architectures")
-            and isinstance(config.architectures, list)
-            and len(config.architectures) > 0
-        )
-        if not self.args.only_pretrain_model and has_model_class_in_config:
-            try:
-                model_class = config.architectures[0]
-                transformers_module = __import__("transformers", fromlist=[model_class])
-                model_cls = getattr(transformers_module, model_class)
-                model = model_cls(config)
-            except ImportError:
-                raise ImportError(
-                    f"{model_class} does not exist. If you just want to test the pretrained model, you might want to"
-                    " set `--only_pretrain_model` or `args.only_pretrain_model=True`."
-                )
-        else:
-            model = MODEL_WITH_LM_HEAD_MAPPING[config.__class__](config)
+        device = self.args.device
+        autocast = self._get_autocast_fn()
 
         if self.args.torchscript:
             raise NotImplementedError("Training for torchscript is currently not implemented")
-        else:
-            train_model = model
+
+        model = self._get_model(model_name, config, training=True)
 
         model.train()
-        model.to(self.args.device)
+        model.to(device)
+
+        if self.args.torch_compile_mode is not None:
+            train_model = self._compile_model(model)
+        else:
+            train_model = model
+        compiled = train_model is not model
 
         # encoder-decoder has vocab size saved differently
         vocab_size = config.vocab_size if hasattr(config, "vocab_size") else config.encoder.vocab_size
-        input_ids = torch.randint(vocab_size, (batch_size, sequence_length), dtype=torch.long, device=self.args.device)
+        input_ids = torch.randint(vocab_size, (batch_size, sequence_length), dtype=torch.long, device=device)
 
-        if self.args.fp16:
+        if self.args.use_amp:
             logger.info("Running training in Mixed Precision...")
             if not self.args.is_gpu:
                 raise ValueError("Mixed precision is possible only for GPU.")
 
-            # amp seems to have memory leaks so that memory usage
-            # is measured using .half() for now https://github.com/NVIDIA/apex/issues/439
-            model.half()
+        # bf16 has the same exponent range as fp32, so only fp16 (on cuda) needs loss scaling. There is no optimizer
+        # step in the benchmark, hence the scaler is only used to scale the loss before the backward pass.
+        scaler = None
+        if self.args.fp16 and not self.args.bf16 and device.type == "cuda":
+            scaler = torch.cuda.amp.GradScaler()
 
         def compute_loss_and_backprob_encoder():
-            loss = train_model(input_ids, labels=input_ids)[0]
-            loss.backward()
+            model.zero_grad(set_to_none=True)
+            with autocast():
+                loss = train_model(input_ids, labels=input_ids)[0]
+            (scaler.scale(loss) if scaler is not None else loss).backward()
             return loss
 
         def compute_loss_and_backprob_encoder_decoder():
-            loss = train_model(input_ids, decoder_input_ids=input_ids, labels=input_ids)[0]
-            loss.backward()
+            model.zero_grad(set_to_none=True)
+            with autocast():
+                loss = train_model(input_ids, decoder_input_ids=input_ids, labels=input_ids)[0]
+            (scaler.scale(loss) if scaler is not None else loss).backward()
             return loss
 
         _train = (
@@ -193,24 +294,55 @@ class PyTorchBenchmark(Benchmark):
             if config.is_encoder_decoder
             else compute_loss_and_backprob_encoder
         )
-        return _train
+        return _train, compiled
+
+    def _autorange(self, timer: timeit.Timer) -> int:
+        # same as `timeit.Timer.autorange` but with a configurable minimal time
+        i = 1
+        while True:
+            for j in (1, 2, 5):
+                number = i * j
+                if timer.timeit(number) >= self.args.min_time_seconds:
+                    return number
+            i *= 10
+
+    def _measure_speed(self, func, compiled: bool = False) -> float:
+        synchronize = self._get_synchronize_fn()
+        if self.args.is_gpu:
+            forward_or_train_func = func
+
+            # kernels are launched asynchronously, so wait for them to finish to include them in the measured time
+            def func():
+                forward_or_train_func()
+                synchronize()
 
-    def _measure_speed(self, func) -> float:
         try:
-            if self.args.is_tpu or self.args.torchscript:
-                # run additional 10 times to stabilize compilation for tpu and torchscript
-                logger.info("Do inference on TPU or torchscript. Running model 5 times to stabilize compilation")
+            if compiled:
+                # the first calls compile the model, which should not be part of the measured time
+                compile_time = timeit.timeit(func, number=2)
+                logger.info(f"Compiling and running the model twice took {compile_time:.3f}s")
+            elif self.args.is_tpu or self.args.torchscript or self.args.jit_mode:
+                # run additional 10 times to stabilize compilation for tpu, torchscript and jit mode
+                logger.info(
+                    "Do inference on TPU, torchscript or jit mode. Running model 5 times to stabilize compilation"
+                )
                 timeit.repeat(
                     func,
                     repeat=1,
                     number=5,
                 )
+            else:
+                # run once so that the caching allocator already holds the activation blocks in the timed runs
+                func()
+            synchronize()
+
+            timer = timeit.Timer(func)
+            number = self._autorange(timer)
 
             # as written in https://docs.python.org/2/library/timeit.html#timeit.Timer.repeat, min should be taken rather than the average
-            runtimes = timeit.repeat(
-                func,
+            runtimes = timer.repeat(
                 repeat=self.args.repeat,
-                number=10,
+                number=number,
             )
 
             if self.args.is_tpu and self.args.torch_xla_tpu_print_metrics:
@@ -218,7 +350,7 @@ class PyTorchBenchmark(Benchmark):
 
                 self.print_fn(met.metrics_report())
 
-            return min(runtimes) / 10.0
+            return min(runtimes) / number
         except RuntimeError as e:
             self.print_fn(f"Doesn't fit on GPU. {e}")
             return "N/A"
@@ -15,7 +15,7 @@
 # limitations under the License.
 
 from dataclasses import dataclass, field
-from typing import Tuple
+from typing import Optional, Tuple
 
 from ..utils import (
     cached_property,
@@ -67,6 +67,12 @@ class PyTorchBenchmarkArguments(BenchmarkArguments):
         self.torchscript = kwargs.pop("torchscript", self.torchscript)
         self.torch_xla_tpu_print_metrics = kwargs.pop("torch_xla_tpu_print_metrics", self.torch_xla_tpu_print_metrics)
         self.fp16_opt_level = kwargs.pop("fp16_opt_level", self.fp16_opt_level)
+        self.bf16 = kwargs.pop("bf16", self.bf16)
+        self.jit_mode = kwargs.pop("jit_mode", self.jit_mode)
+        self.time_encoder_separately = kwargs.pop("time_encoder_separately", self.time_encoder_separately)
+        self.int32_input_ids = kwargs.pop("int32_input_ids", self.int32_input_ids)
+        self.torch_compile_mode = kwargs.pop("torch_compile_mode", self.torch_compile_mode)
+        self.min_time_seconds = kwargs.pop("min_time_seconds", self.min_time_seconds)
         super().__init__(**kwargs)
 
     torchscript: bool = field(default=False, metadata={"help": "Trace the models using torchscript"})
@@ -80,6 +86,55 @@ class PyTorchBenchmarkArguments(BenchmarkArguments):
             )
         },
     )
+    bf16: bool = field(
+        default=False,
+        metadata={"help": "Use BF16 mixed precision (instead of FP16) to accelerate inference and training."},
+    )
+    jit_mode: bool = field(
+        default=False,
+        metadata={
+            "help": (
+                "Trace, freeze and optimize the model for inference with PyTorch jit before measuring inference. Falls"
+                " back to eager mode if the model cannot be traced. Not used for training."
+            )
+        },
+    )
+    time_encoder_separately: bool = field(
+        default=False,
+        metadata={
+            "help": (
+                "For encoder-decoder models, compute the encoder outputs once before measuring inference so that only"
+                " the decoder forward pass is measured."
+            )
+        },
+    )
+    int32_input_ids: bool = field(
+        default=False,
+        metadata={
+            "help": (
+                "Create the `input_ids` used to measure inference as int32 instead of int64. Halves the size of the"
+                " indices, but is not supported by all models. Not used for training, since labels have to be int64."
+            )
+        },
+    )
+    torch_compile_mode: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": (
+                "Which mode to use with `torch.compile`, passing one will trigger a model compilation. Compilation"
+                " happens during the warm up runs and is not included in the measured time."
+            )
+        },
+    )
+    min_time_seconds: float = field(
+        default=0.2,
+        metadata={
+            "help": (
+                "Minimal time in seconds of each timed run. The number of model calls per run is increased (1, 2, 5,"
+                " 10, 20, 50, ...) until it takes at least this long."
+            )
+        },
+    )
 
     @cached_property
     def _setup_devices(self) -> Tuple["torch.device", int]:
@@ -122,3 +177,12 @@ class PyTorchBenchmarkArguments(BenchmarkArguments):
     @property
     def is_gpu(self):
         return self.n_gpu > 0
+
+    @property
+    def use_amp(self) -> bool:
+        return self.fp16 or self.bf16
+
+    @property
+    def amp_dtype(self) -> "torch.dtype":
+        requires_backends(self, ["torch"])
+        return torch.bfloat16 if self.bf16 else torch.float16
@@ -221,18 +221,17 @@ def measure_peak_memory_cpu(function: Callable[[], None], interval=0.5, device_i
         - `max_memory`: (`int`) consumed memory peak in Bytes
     """
 
-    def get_cpu_memory(process_id: int) -> int:
+    def get_cpu_memory(process: "psutil.Process") -> int:
         """
-        measures current cpu memory usage of a given `process_id`
+        measures current cpu memory usage of a given `process`
 
         Args:
-            - `process_id`: (`int`) process_id for which to measure memory
+            - `process`: (`psutil.Process`) process for which to measure memory
 
         Returns
 
             - `memory`: (`int`) consumed memory in Bytes
         """
-        process = psutil.Process(process_id)
         try:
             meminfo_attr = "memory_info" if hasattr(process, "memory_info") else "get_memory_info"
             memory = getattr(process, meminfo_attr)()[0]
@@ -261,13 +260,15 @@ def measure_peak_memory_cpu(function: Callable[[], None], interval=0.5, device_i
                 self.interval = interval
                 self.connection = child_connection
                 self.num_measurements = 1
-                self.mem_usage = get_cpu_memory(self.process_id)
+                self.mem_usage = get_cpu_memory(psutil.Process(self.process_id))
 
             def run(self):
+                # create the psutil handle only once instead of for every measurement
+                process = psutil.Process(self.process_id)
                 self.connection.send(0)
                 stop = False
                 while True:
-                    self.mem_usage = max(self.mem_usage, get_cpu_memory(self.process_id))
+                    self.mem_usage = max(self.mem_usage, get_cpu_memory(process))
                     self.num_measurements += 1
 
                     if stop:
@@ -788,6 +789,11 @@ class Benchmark(ABC):
             info["framework"] = self.framework
             if self.framework == "PyTorch":
                 info["use_torchscript"] = self.args.torchscript
+                info["use_jit_mode"] = self.args.jit_mode
+                info["torch_compile_mode"] = self.args.torch_compile_mode
+                info["time_encoder_separately"] = self.args.time_encoder_separately
+                info["bf16"] = self.args.bf16
+                info["int32_input_ids"] = self.args.int32_input_ids
             if self.framework == "TensorFlow":
                 info["eager_mode"] = self.args.eager_mode
                 info["use_xla"] = self.args.use_xla
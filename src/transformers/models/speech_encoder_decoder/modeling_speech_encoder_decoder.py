@@ -329,6 +329,8 @@ class SpeechEncoderDecoderModel(PreTrainedModel):
                 - To update the encoder configuration, use the prefix *encoder_* for each configuration parameter.
                 - To update the decoder configuration, use the prefix *decoder_* for each configuration parameter.
                 - To update the parent model configuration, do not use a prefix for each configuration parameter.
+                - `torch_dtype` is used to load both the encoder and the decoder, unless overridden by
+                  `encoder_torch_dtype` or `decoder_torch_dtype`.
 
                 Behaves differently depending on whether a `config` is provided or automatically loaded.
 
@@ -361,6 +363,12 @@ class SpeechEncoderDecoderModel(PreTrainedModel):
         for key in kwargs_decoder.keys():
             del kwargs["decoder_" + key]
 
+        # `torch_dtype` also applies to the encoder and the decoder (unless overridden with the prefixed arguments) so
+        # that their weights are directly loaded in that dtype instead of being loaded in float32
+        if "torch_dtype" in kwargs:
+            kwargs_encoder.setdefault("torch_dtype", kwargs["torch_dtype"])
+            kwargs_decoder.setdefault("torch_dtype", kwargs["torch_dtype"])
+
         # Load and initialize the encoder and decoder
         # The distinction between encoder and decoder at the model level is made
         # by the value of the flag `is_decoder` that we need to set correctly.
@@ -12,39 +12,87 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import os
 import tempfile
+import time
 import unittest
 from pathlib import Path
+from unittest import mock
+
+from parameterized import parameterized
 
 from transformers import AutoConfig, is_torch_available
-from transformers.testing_utils import require_torch, torch_device
+from transformers.testing_utils import require_torch, require_torch_bf16_gpu, torch_device
 
 
 if is_torch_available():
     from transformers import PyTorchBenchmark, PyTorchBenchmarkArguments
+    from transformers.pytorch_utils import is_torch_greater_or_equal_than_2_0
+else:
+    is_torch_greater_or_equal_than_2_0 = False
 
 
 @require_torch
 class BenchmarkTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # only load each config once for all the tests that pass explicit configs
+        cls._configs = {
+            model_id: AutoConfig.from_pretrained(model_id)
+            for model_id in ["sshleifer/tiny-gpt2", "sshleifer/tinier_bart"]
+        }
+
+    def get_config(self, model_id):
+        # tests may modify the config, so each of them gets its own copy
+        return copy.deepcopy(self._configs[model_id])
+
     def check_results_dict_not_empty(self, results):
         for model_result in results.values():
             for batch_size, sequence_length in zip(model_result["bs"], model_result["ss"]):
                 result = model_result["result"][batch_size][sequence_length]
                 self.assertIsNotNone(result)
 
-    def test_inference_no_configs(self):
+    @parameterized.expand(
+        [
+            ("no_configs", "sshleifer/tiny-gpt2", False),
+            ("with_configs", "sshleifer/tiny-gpt2", True),
+            ("encoder_decoder_with_configs", "sshleifer/tinier_bart", True),
+        ]
+    )
+    def test_inference_and_train(self, _, model_id, with_configs):
+        # a single run covers both the inference and the training benchmarks
+        configs = [self.get_config(model_id)] if with_configs else None
+        benchmark_args = PyTorchBenchmarkArguments(
+            models=[model_id],
+            training=True,
+            inference=True,
+            sequence_lengths=[8],
+            batch_sizes=[1],
+            multi_process=False,
+        )
+        benchmark = PyTorchBenchmark(benchmark_args, configs=configs)
+        results = benchmark.run()
+        self.check_results_dict_not_empty(results.time_inference_result)
+        self.check_results_dict_not_empty(results.memory_inference_result)
+        self.check_results_dict_not_empty(results.time_train_result)
+        self.check_results_dict_not_empty(results.memory_train_result)
+
+    def test_model_reused_across_batch_sizes(self):
         MODEL_ID = "sshleifer/tiny-gpt2"
         benchmark_args = PyTorchBenchmarkArguments(
             models=[MODEL_ID],
             training=False,
             inference=True,
             sequence_lengths=[8],
-            batch_sizes=[1],
+            batch_sizes=[1, 2],
             multi_process=False,
         )
         benchmark = PyTorchBenchmark(benchmark_args)
-        results = benchmark.run()
+        with mock.patch.object(benchmark, "_create_model", wraps=benchmark._create_model) as create_model:
+            results = benchmark.run()
+        # speed and memory of both batch sizes are measured with the same model
+        self.assertEqual(create_model.call_count, 1)
         self.check_results_dict_not_empty(results.time_inference_result)
         self.check_results_dict_not_empty(results.memory_inference_result)
 
@@ -80,14 +128,13 @@ class BenchmarkTest(unittest.TestCase):
         self.check_results_dict_not_empty(results.time_inference_result)
         self.check_results_dict_not_empty(results.memory_inference_result)
 
-    @unittest.skipIf(torch_device == "cpu", "Cant do half precision")
-    def test_inference_fp16(self):
+    def test_inference_jit_mode(self):
         MODEL_ID = "sshleifer/tiny-gpt2"
         benchmark_args = PyTorchBenchmarkArguments(
             models=[MODEL_ID],
             training=False,
             inference=True,
-            fp16=True,
+            jit_mode=True,
             sequence_lengths=[8],
             batch_sizes=[1],
             multi_process=False,
@@ -97,78 +144,82 @@ class BenchmarkTest(unittest.TestCase):
         self.check_results_dict_not_empty(results.time_inference_result)
         self.check_results_dict_not_empty(results.memory_inference_result)
 
-    def test_inference_no_model_no_architectures(self):
+    @unittest.skipIf(not is_torch_greater_or_equal_than_2_0, reason="`torch.compile` requires torch>=2.0")
+    def test_inference_torch_compile(self):
         MODEL_ID = "sshleifer/tiny-gpt2"
-        config = AutoConfig.from_pretrained(MODEL_ID)
-        # set architectures equal to `None`
-        config.architectures = None
         benchmark_args = PyTorchBenchmarkArguments(
             models=[MODEL_ID],
-            training=True,
+            training=False,
             inference=True,
+            torch_compile_mode="default",
             sequence_lengths=[8],
             batch_sizes=[1],
             multi_process=False,
         )
-        benchmark = PyTorchBenchmark(benchmark_args, configs=[config])
+        benchmark = PyTorchBenchmark(benchmark_args)
         results = benchmark.run()
         self.check_results_dict_not_empty(results.time_inference_result)
         self.check_results_dict_not_empty(results.memory_inference_result)
 
-    def test_train_no_configs(self):
+    def test_inference_int32_input_ids(self):
         MODEL_ID = "sshleifer/tiny-gpt2"
         benchmark_args = PyTorchBenchmarkArguments(
             models=[MODEL_ID],
-            training=True,
-            inference=False,
+            training=False,
+            inference=True,
+            int32_input_ids=True,
             sequence_lengths=[8],
             batch_sizes=[1],
             multi_process=False,
         )
         benchmark = PyTorchBenchmark(benchmark_args)
         results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_train_result)
-        self.check_results_dict_not_empty(results.memory_train_result)
+        self.check_results_dict_not_empty(results.time_inference_result)
+        self.check_results_dict_not_empty(results.memory_inference_result)
+        self.assertTrue(benchmark.environment_info["int32_input_ids"])
 
-    @unittest.skipIf(torch_device == "cpu", "Can't do half precision")
-    def test_train_no_configs_fp16(self):
+    @unittest.skipIf(torch_device == "cpu", "Cant do half precision")
+    def test_inference_fp16(self):
         MODEL_ID = "sshleifer/tiny-gpt2"
         benchmark_args = PyTorchBenchmarkArguments(
             models=[MODEL_ID],
-            training=True,
-            inference=False,
+            training=False,
+            inference=True,
+            fp16=True,
             sequence_lengths=[8],
             batch_sizes=[1],
-            fp16=True,
             multi_process=False,
         )
         benchmark = PyTorchBenchmark(benchmark_args)
         results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_train_result)
-        self.check_results_dict_not_empty(results.memory_train_result)
+        self.check_results_dict_not_empty(results.time_inference_result)
+        self.check_results_dict_not_empty(results.memory_inference_result)
 
-    def test_inference_with_configs(self):
+    @require_torch_bf16_gpu
+    def test_inference_bf16(self):
         MODEL_ID = "sshleifer/tiny-gpt2"
-        config = AutoConfig.from_pretrained(MODEL_ID)
         benchmark_args = PyTorchBenchmarkArguments(
             models=[MODEL_ID],
             training=False,
             inference=True,
+            bf16=True,
             sequence_lengths=[8],
             batch_sizes=[1],
             multi_process=False,
         )
-        benchmark = PyTorchBenchmark(benchmark_args, configs=[config])
+        benchmark = PyTorchBenchmark(benchmark_args)
         results = benchmark.run()
         self.check_results_dict_not_empty(results.time_inference_result)
         self.check_results_dict_not_empty(results.memory_inference_result)
 
-    def test_inference_encoder_decoder_with_configs(self):
-        MODEL_ID = "sshleifer/tinier_bart"
-        config = AutoConfig.from_pretrained(MODEL_ID)
+    def test_inference_no_model_no_architectures(self):
+        MODEL_ID = "sshleifer/tiny-gpt2"
+        config = self.get_config(MODEL_ID)
+        # set architectures equal to `None`
+        config.architectures = None
         benchmark_args = PyTorchBenchmarkArguments(
             models=[MODEL_ID],
-            training=False,
+            training=True,
             inference=True,
             sequence_lengths=[8],
             batch_sizes=[1],
@@ -179,37 +230,69 @@ class BenchmarkTest(unittest.TestCase):
         self.check_results_dict_not_empty(results.time_inference_result)
         self.check_results_dict_not_empty(results.memory_inference_result)
 
-    def test_train_with_configs(self):
+    @unittest.skipIf(torch_device == "cpu", "Can't do half precision")
+    def test_train_no_configs_fp16(self):
         MODEL_ID = "sshleifer/tiny-gpt2"
-        config = AutoConfig.from_pretrained(MODEL_ID)
         benchmark_args = PyTorchBenchmarkArguments(
             models=[MODEL_ID],
             training=True,
             inference=False,
             sequence_lengths=[8],
             batch_sizes=[1],
+            fp16=True,
             multi_process=False,
         )
-        benchmark = PyTorchBenchmark(benchmark_args, configs=[config])
+        benchmark = PyTorchBenchmark(benchmark_args)
         results = benchmark.run()
         self.check_results_dict_not_empty(results.time_train_result)
         self.check_results_dict_not_empty(results.memory_train_result)
 
-    def test_train_encoder_decoder_with_configs(self):
+    def test_inference_encoder_decoder_time_encoder_separately(self):
         MODEL_ID = "sshleifer/tinier_bart"
-        config = AutoConfig.from_pretrained(MODEL_ID)
+        config = self.get_config(MODEL_ID)
         benchmark_args = PyTorchBenchmarkArguments(
             models=[MODEL_ID],
-            training=True,
+            training=False,
             inference=True,
+            time_encoder_separately=True,
             sequence_lengths=[8],
             batch_sizes=[1],
             multi_process=False,
         )
         benchmark = PyTorchBenchmark(benchmark_args, configs=[config])
         results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_train_result)
-        self.check_results_dict_not_empty(results.memory_train_result)
+        self.check_results_dict_not_empty(results.time_inference_result)
+        self.check_results_dict_not_empty(results.memory_inference_result)
+
+    def test_measure_speed_min_time_seconds(self):
+        MODEL_ID = "sshleifer/tiny-gpt2"
+        sleep_seconds = 0.01
+        num_calls = 0
+
+        def func():
+            nonlocal num_calls
+            num_calls += 1
+            time.sleep(sleep_seconds)
+
+        # with no minimal time, the first timed call is enough and every repeat only calls the function once
+        benchmark_args = PyTorchBenchmarkArguments(
+            models=[MODEL_ID], min_time_seconds=0.0, repeat=2, multi_process=False
+        )
+        benchmark = PyTorchBenchmark(benchmark_args)
+        benchmark._measure_speed(func)
+        # warm-up call, single call to choose the number of calls, then `repeat` runs of a single call
+        self.assertEqual(num_calls, 1 + 1 + 2)
+
+        # 1, 2 and then 5 calls are needed to reach the minimal time, the result is still the time of a single call
+        benchmark_args = PyTorchBenchmarkArguments(
+            models=[MODEL_ID], min_time_seconds=4.5 * sleep_seconds, repeat=2, multi_process=False
+        )
+        benchmark = PyTorchBenchmark(benchmark_args)
+        num_calls = 0
+        runtime = benchmark._measure_speed(func)
+        self.assertEqual(num_calls, 1 + (1 + 2 + 5) + 2 * 5)
+        self.assertGreaterEqual(runtime, sleep_seconds)
+        self.assertLess(runtime, 2 * sleep_seconds)
 
     def test_save_csv_files(self):
         MODEL_ID = "sshleifer/tiny-gpt2"
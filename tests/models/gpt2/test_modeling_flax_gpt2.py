@@ -13,6 +13,7 @@
 # limitations under the License.
 
 
+import os
 import tempfile
 import unittest
 
@@ -60,6 +61,7 @@ class FlaxGPT2ModelTester:
         attention_probs_dropout_prob=0.1,
         max_position_embeddings=512,
         initializer_range=0.02,
+        dtype=None,
     ):
         self.parent = parent
         self.batch_size = batch_size
@@ -82,6 +84,8 @@ class FlaxGPT2ModelTester:
         self.bos_token_id = vocab_size - 1
         self.eos_token_id = vocab_size - 1
         self.pad_token_id = vocab_size - 1
+        # computation dtype of the models built by the `check_*` methods
+        self.dtype = jnp.float32 if dtype is None else dtype
 
     def prepare_config_and_inputs(self):
         input_ids = ids_tensor([self.batch_size, self.seq_length], self.vocab_size)
@@ -124,9 +128,10 @@ class FlaxGPT2ModelTester:
             encoder_attention_mask,
         )
 
-    def check_use_cache_forward(self, model_class_name, config, input_ids, attention_mask):
+    def check_use_cache_forward(self, model_class_name, config, input_ids, attention_mask, model=None):
         max_decoder_length = 20
-        model = model_class_name(config)
+        if model is None:
+            model = model_class_name(config, dtype=self.dtype)
 
         past_key_values = model.init_cache(input_ids.shape[0], max_decoder_length)
         attention_mask = jnp.ones((input_ids.shape[0], max_decoder_length), dtype="i4")
@@ -154,14 +159,12 @@ class FlaxGPT2ModelTester:
         diff = np.max(np.abs((outputs_cache_next[0][:, -1, :5] - outputs[0][:, -1, :5])))
         self.parent.assertTrue(diff < 1e-3, msg=f"Max diff is {diff}")
 
-    def check_use_cache_forward_with_attn_mask(self, model_class_name, config, input_ids, attention_mask):
+    def check_use_cache_forward_with_attn_mask(self, model_class_name, config, input_ids, attention_mask, model=None):
         max_decoder_length = 20
-        model = model_class_name(config)
+        if model is None:
+            model = model_class_name(config, dtype=self.dtype)
 
-        attention_mask_cache = jnp.concatenate(
-            [attention_mask, jnp.zeros((attention_mask.shape[0], max_decoder_length - attention_mask.shape[1]))],
-            axis=-1,
-        )
+        attention_mask_cache = jnp.pad(attention_mask, ((0, 0), (0, max_decoder_length - attention_mask.shape[1])))
 
         past_key_values = model.init_cache(input_ids.shape[0], max_decoder_length)
         position_ids = jnp.broadcast_to(
@@ -187,8 +190,9 @@ class FlaxGPT2ModelTester:
         diff = np.max(np.abs((outputs_cache_next[0][:, -1, :5] - outputs[0][:, -1, :5])))
         self.parent.assertTrue(diff < 1e-3, msg=f"Max diff is {diff}")
 
-    def check_bool_attention_mask_in_generation(self, model_class_name, config, input_ids, attention_mask):
-        model = model_class_name(config)
+    def check_bool_attention_mask_in_generation(self, model_class_name, config, input_ids, attention_mask, model=None):
+        if model is None:
+            model = model_class_name(config, dtype=self.dtype)
 
         output_int_att_mask = model.generate(
             input_ids=input_ids,
@@ -213,28 +217,60 @@ class FlaxGPT2ModelTest(FlaxModelTesterMixin, FlaxGenerationTesterMixin, unittes
     all_model_classes = (FlaxGPT2Model, FlaxGPT2LMHeadModel) if is_flax_available() else ()
     all_generative_model_classes = (FlaxGPT2LMHeadModel,) if is_flax_available() else ()
 
+    @classmethod
+    def setUpClass(cls):
+        cls._models = {}
+
     def setUp(self):
         self.model_tester = FlaxGPT2ModelTester(self)
 
+    def get_model(self, model_class, config):
+        # the tests below neither modify the model nor its config, so each model class is only initialized once
+        dtype = self.model_tester.dtype
+        if (model_class, dtype) not in self._models:
+            self._models[(model_class, dtype)] = model_class(config, dtype=dtype)
+        return self._models[(model_class, dtype)]
+
     def test_use_cache_forward(self):
+        # the inputs do not depend on the model class
+        config, input_ids, attention_mask = self.model_tester.prepare_config_and_inputs()
         for model_class_name in self.all_model_classes:
-            config, input_ids, attention_mask = self.model_tester.prepare_config_and_inputs()
-            self.model_tester.check_use_cache_forward(model_class_name, config, input_ids, attention_mask)
+            self.model_tester.check_use_cache_forward(
+                model_class_name,
+                config,
+                input_ids,
+                attention_mask,
+                model=self.get_model(model_class_name, config),
+            )
 
     def test_use_cache_forward_with_attn_mask(self):
+        # the inputs do not depend on the model class
+        config, input_ids, attention_mask = self.model_tester.prepare_config_and_inputs()
         for model_class_name in self.all_model_classes:
-            config, input_ids, attention_mask = self.model_tester.prepare_config_and_inputs()
             self.model_tester.check_use_cache_forward_with_attn_mask(
-                model_class_name, config, input_ids, attention_mask
+                model_class_name,
+                config,
+                input_ids,
+                attention_mask,
+                model=self.get_model(model_class_name, config),
             )
 
     def test_bool_attention_mask_in_generation(self):
         for model_class_name in self.all_generative_model_classes:
             config, input_ids, attention_mask = self.model_tester.prepare_config_and_inputs()
             self.model_tester.check_bool_attention_mask_in_generation(
-                model_class_name, config, input_ids, attention_mask
+                model_class_name,
+                config,
+                input_ids,
+                attention_mask,
+                model=self.get_model(model_class_name, config),
             )
 
+    def test_bool_attention_mask_in_generation_bf16(self):
+        # both generations run the exact same bf16 computation, so the outputs can still be compared exactly
+        self.model_tester = FlaxGPT2ModelTester(self, dtype=jnp.bfloat16)
+        self.test_bool_attention_mask_in_generation()
+
     @slow
     def test_batch_generation(self):
         tokenizer = GPT2Tokenizer.from_pretrained("openai-community/gpt2", pad_token="</s>", padding_side="left")
@@ -263,102 +299,111 @@ class FlaxGPT2ModelTest(FlaxModelTesterMixin, FlaxGenerationTesterMixin, unittes
     def test_equivalence_pt_to_flax(self):
         config, inputs_dict = self.model_tester.prepare_config_and_inputs_for_common()
 
-        for model_class in self.all_model_classes:
-            with self.subTest(model_class.__name__):
-                # prepare inputs
-                prepared_inputs_dict = self._prepare_for_class(inputs_dict, model_class)
-                pt_inputs = {k: torch.tensor(v.tolist()) for k, v in prepared_inputs_dict.items()}
-
-                # load corresponding PyTorch class
-                pt_model_class_name = model_class.__name__[4:]  # Skip the "Flax" at the beginning
-                pt_model_class = getattr(transformers, pt_model_class_name)
-
-                batch_size, seq_length = pt_inputs["input_ids"].shape
-                rnd_start_indices = np.random.randint(0, seq_length - 1, size=(batch_size,))
-                for batch_idx, start_index in enumerate(rnd_start_indices):
-                    pt_inputs["attention_mask"][batch_idx, :start_index] = 0
-                    pt_inputs["attention_mask"][batch_idx, start_index:] = 1
-                    prepared_inputs_dict["attention_mask"][batch_idx, :start_index] = 0
-                    prepared_inputs_dict["attention_mask"][batch_idx, start_index:] = 1
-                pt_model = pt_model_class(config).eval()
-                fx_model = model_class(config, dtype=jnp.float32)
-
-                fx_state = convert_pytorch_state_dict_to_flax(pt_model.state_dict(), fx_model)
-                fx_model.params = fx_state
-
-                with torch.no_grad():
-                    pt_outputs = pt_model(**pt_inputs).to_tuple()
-
-                fx_outputs = fx_model(**prepared_inputs_dict).to_tuple()
-                self.assertEqual(len(fx_outputs), len(pt_outputs), "Output lengths differ between Flax and PyTorch")
-                for fx_output, pt_output in zip(fx_outputs, pt_outputs):
-                    self.assert_almost_equals(fx_output[:, -1], pt_output[:, -1].numpy(), 4e-2)
-
-                with tempfile.TemporaryDirectory() as tmpdirname:
-                    pt_model.save_pretrained(tmpdirname)
-                    fx_model_loaded = model_class.from_pretrained(tmpdirname, from_pt=True)
-
-                fx_outputs_loaded = fx_model_loaded(**prepared_inputs_dict).to_tuple()
-                self.assertEqual(
-                    len(fx_outputs_loaded), len(pt_outputs), "Output lengths differ between Flax and PyTorch"
-                )
-                for fx_output_loaded, pt_output in zip(fx_outputs_loaded, pt_outputs):
-                    self.assert_almost_equals(fx_output_loaded[:, -1], pt_output[:, -1].numpy(), 4e-2)
+        # a single temporary directory for all model classes, each of them saves to its own subdirectory
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for model_class in self.all_model_classes:
+                with self.subTest(model_class.__name__):
+                    # prepare inputs
+                    prepared_inputs_dict = self._prepare_for_class(inputs_dict, model_class)
+                    pt_inputs = {k: torch.from_numpy(np.asarray(v)) for k, v in prepared_inputs_dict.items()}
+
+                    # load corresponding PyTorch class
+                    pt_model_class_name = model_class.__name__[4:]  # Skip the "Flax" at the beginning
+                    pt_model_class = getattr(transformers, pt_model_class_name)
+
+                    batch_size, seq_length = pt_inputs["input_ids"].shape
+                    rnd_start_indices = np.random.randint(0, seq_length - 1, size=(batch_size,))
+                    attention_mask = (np.arange(seq_length)[None, :] >= rnd_start_indices[:, None]).astype(np.int32)
+                    prepared_inputs_dict["attention_mask"] = attention_mask
+                    pt_inputs["attention_mask"] = torch.from_numpy(attention_mask)
+                    pt_model = pt_model_class(config).eval()
+                    fx_model = model_class(config, dtype=jnp.float32)
+
+                    fx_state = convert_pytorch_state_dict_to_flax(pt_model.state_dict(), fx_model)
+                    fx_model.params = fx_state
+
+                    with torch.no_grad():
+                        pt_outputs = pt_model(**pt_inputs).to_tuple()
+
+                    fx_outputs = fx_model(**prepared_inputs_dict).to_tuple()
+                    self.assertEqual(
+                        len(fx_outputs), len(pt_outputs), "Output lengths differ between Flax and PyTorch"
+                    )
+                    for fx_output, pt_output in zip(fx_outputs, pt_outputs):
+                        self.assert_almost_equals(fx_output[:, -1], pt_output[:, -1].numpy(), 4e-2)
+
+                    save_dir = os.path.join(tmp_dir, model_class.__name__)
+                    pt_model.save_pretrained(save_dir)
+                    fx_model_loaded = model_class.from_pretrained(save_dir, from_pt=True)
+
+                    fx_outputs_loaded = fx_model_loaded(**prepared_inputs_dict).to_tuple()
+                    self.assertEqual(
+                        len(fx_outputs_loaded), len(pt_outputs), "Output lengths differ between Flax and PyTorch"
+                    )
+                    for fx_output_loaded, pt_output in zip(fx_outputs_loaded, pt_outputs):
+                        self.assert_almost_equals(fx_output_loaded[:, -1], pt_output[:, -1].numpy(), 4e-2)
 
     # overwrite from common since `attention_mask` in combination
     # with `causal_mask` behaves slighly differently
     @is_pt_flax_cross_test
     def test_equivalence_flax_to_pt(self):
         config, inputs_dict = self.model_tester.prepare_config_and_inputs_for_common()
-        for model_class in self.all_model_classes:
-            with self.subTest(model_class.__name__):
-                # prepare inputs
-                prepared_inputs_dict = self._prepare_for_class(inputs_dict, model_class)
-                pt_inputs = {k: torch.tensor(v.tolist()) for k, v in prepared_inputs_dict.items()}
-
-                # load corresponding PyTorch class
-                pt_model_class_name = model_class.__name__[4:]  # Skip the "Flax" at the beginning
-                pt_model_class = getattr(transformers, pt_model_class_name)
-
-                pt_model = pt_model_class(config).eval()
-                fx_model = model_class(config, dtype=jnp.float32)
-
-                pt_model = load_flax_weights_in_pytorch_model(pt_model, fx_model.params)
-                batch_size, seq_length = pt_inputs["input_ids"].shape
-                rnd_start_indices = np.random.randint(0, seq_length - 1, size=(batch_size,))
-                for batch_idx, start_index in enumerate(rnd_start_indices):
-                    pt_inputs["attention_mask"][batch_idx, :start_index] = 0
-                    pt_inputs["attention_mask"][batch_idx, start_index:] = 1
-                    prepared_inputs_dict["attention_mask"][batch_idx, :start_index] = 0
-                    prepared_inputs_dict["attention_mask"][batch_idx, start_index:] = 1
-
-                # make sure weights are tied in PyTorch
-                pt_model.tie_weights()
-
-                with torch.no_grad():
-                    pt_outputs = pt_model(**pt_inputs).to_tuple()
-
-                fx_outputs = fx_model(**prepared_inputs_dict).to_tuple()
-                self.assertEqual(len(fx_outputs), len(pt_outputs), "Output lengths differ between Flax and PyTorch")
-                for fx_output, pt_output in zip(fx_outputs, pt_outputs):
-                    self.assert_almost_equals(fx_output[:, -1], pt_output[:, -1].numpy(), 4e-2)
-
-                with tempfile.TemporaryDirectory() as tmpdirname:
-                    fx_model.save_pretrained(tmpdirname)
-                    pt_model_loaded = pt_model_class.from_pretrained(tmpdirname, from_flax=True)
-
-                with torch.no_grad():
-                    pt_outputs_loaded = pt_model_loaded(**pt_inputs).to_tuple()
-
-                self.assertEqual(
-                    len(fx_outputs), len(pt_outputs_loaded), "Output lengths differ between Flax and PyTorch"
-                )
-                for fx_output, pt_output in zip(fx_outputs, pt_outputs_loaded):
-                    self.assert_almost_equals(fx_output[:, -1], pt_output[:, -1].numpy(), 4e-2)
+        # a single temporary directory for all model classes, each of them saves to its own subdirectory
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for model_class in self.all_model_classes:
+                with self.subTest(model_class.__name__):
+                    # prepare inputs
+                    prepared_inputs_dict = self._prepare_for_class(inputs_dict, model_class)
+                    pt_inputs = {k: torch.from_numpy(np.asarray(v)) for k, v in prepared_inputs_dict.items()}
+
+                    # load corresponding PyTorch class
+                    pt_model_class_name = model_class.__name__[4:]  # Skip the "Flax" at the beginning
+                    pt_model_class = getattr(transformers, pt_model_class_name)
+
+                    pt_model = pt_model_class(config).eval()
+                    fx_model = model_class(config, dtype=jnp.float32)
+
+                    pt_model = load_flax_weights_in_pytorch_model(pt_model, fx_model.params)
+                    batch_size, seq_length = pt_inputs["input_ids"].shape
+                    rnd_start_indices = np.random.randint(0, seq_length - 1, size=(batch_size,))
+                    attention_mask = (np.arange(seq_length)[None, :] >= rnd_start_indices[:, None]).astype(np.int32)
+                    prepared_inputs_dict["attention_mask"] = attention_mask
+                    pt_inputs["attention_mask"] = torch.from_numpy(attention_mask)
+
+                    # make sure weights are tied in PyTorch
+                    pt_model.tie_weights()
+
+                    with torch.no_grad():
+                        pt_outputs = pt_model(**pt_inputs).to_tuple()
+
+                    fx_outputs = fx_model(**prepared_inputs_dict).to_tuple()
+                    self.assertEqual(
+                        len(fx_outputs), len(pt_outputs), "Output lengths differ between Flax and PyTorch"
+                    )
+                    for fx_output, pt_output in zip(fx_outputs, pt_outputs):
+                        self.assert_almost_equals(fx_output[:, -1], pt_output[:, -1].numpy(), 4e-2)
+
+                    save_dir = os.path.join(tmp_dir, model_class.__name__)
+                    fx_model.save_pretrained(save_dir)
+                    pt_model_loaded = pt_model_class.from_pretrained(save_dir, from_flax=True)
+
+                    with torch.no_grad():
+                        pt_outputs_loaded = pt_model_loaded(**pt_inputs).to_tuple()
+
+                    self.assertEqual(
+                        len(fx_outputs), len(pt_outputs_loaded), "Output lengths differ between Flax and PyTorch"
+                    )
+                    for fx_output, pt_output in zip(fx_outputs, pt_outputs_loaded):
+                        self.assert_almost_equals(fx_output[:, -1], pt_output[:, -1].numpy(), 4e-2)
 
     @slow
     def test_model_from_pretrained(self):
+        # load the PyTorch checkpoint only once for all model classes, loading with `from_pt=True` is already covered
+        # by `test_equivalence_pt_to_flax`
+        pt_model = transformers.GPT2Model.from_pretrained("openai-community/gpt2")
+        pt_state_dict = pt_model.state_dict()
         for model_class_name in self.all_model_classes:
-            model = model_class_name.from_pretrained("openai-community/gpt2", from_pt=True)
+            model = model_class_name(pt_model.config)
+            model.params = convert_pytorch_state_dict_to_flax(pt_state_dict, model)
             outputs = model(np.ones((1, 1)))
             self.assertIsNotNone(outputs)
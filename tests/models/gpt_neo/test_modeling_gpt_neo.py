@@ -15,15 +15,17 @@
 """ Testing suite for the PyTorch GPT Neo model. """
 
 
+import copy
 import unittest
 
+from parameterized import parameterized
+
 from transformers import GPTNeoConfig, is_torch_available
-from transformers.testing_utils import require_torch, slow, torch_device
-from transformers.utils import cached_property
+from transformers.testing_utils import backend_empty_cache, require_torch, slow, torch_device
 
 from ...generation.test_utils import GenerationTesterMixin
 from ...test_configuration_common import ConfigTester
-from ...test_modeling_common import ModelTesterMixin, floats_tensor, ids_tensor, random_attention_mask
+from ...test_modeling_common import ModelTesterMixin, ids_tensor, random_attention_mask
 from ...test_pipeline_mixin import PipelineTesterMixin
 
 
@@ -51,7 +53,7 @@ class GPTNeoModelTester:
         use_token_type_ids=True,
         use_input_mask=True,
         use_labels=True,
-        use_mc_token_ids=True,
+        use_mc_token_ids=False,
         vocab_size=99,
         hidden_size=32,
         num_hidden_layers=2,
@@ -96,6 +98,9 @@ class GPTNeoModelTester:
         self.eos_token_id = vocab_size - 1
         self.pad_token_id = vocab_size - 1
         self.attention_types = attention_types
+        # the head mask is drawn from a seeded generator so that the heads masked in a test do not depend on the order
+        # in which the tests are run
+        self.head_mask_generator = torch.Generator().manual_seed(0)
 
     def get_large_model_config(self):
         return GPTNeoConfig.from_pretrained("gpt-neo-125M")
@@ -125,7 +130,9 @@ class GPTNeoModelTester:
 
         config = self.get_config()
 
-        head_mask = ids_tensor([self.num_hidden_layers, self.num_attention_heads], 2)
+        head_mask = torch.randint(
+            0, 2, (self.num_hidden_layers, self.num_attention_heads), generator=self.head_mask_generator
+        ).to(torch_device)
 
         return (
             config,
@@ -159,43 +166,15 @@ class GPTNeoModelTester:
         config.vocab_size = 300
         return config
 
-    def prepare_config_and_inputs_for_decoder(self):
-        (
-            config,
-            input_ids,
-            input_mask,
-            head_mask,
-            token_type_ids,
-            mc_token_ids,
-            sequence_labels,
-            token_labels,
-            choice_labels,
-        ) = self.prepare_config_and_inputs()
-
-        encoder_hidden_states = floats_tensor([self.batch_size, self.seq_length, self.hidden_size])
-        encoder_attention_mask = ids_tensor([self.batch_size, self.seq_length], vocab_size=2)
-
-        return (
-            config,
-            input_ids,
-            input_mask,
-            head_mask,
-            token_type_ids,
-            sequence_labels,
-            token_labels,
-            choice_labels,
-            encoder_hidden_states,
-            encoder_attention_mask,
-        )
-
     def create_and_check_gpt_neo_model(self, config, input_ids, input_mask, head_mask, token_type_ids, *args):
         model = GPTNeoModel(config=config)
         model.to(torch_device)
         model.eval()
 
-        result = model(input_ids, token_type_ids=token_type_ids, head_mask=head_mask)
-        result = model(input_ids, token_type_ids=token_type_ids)
-        result = model(input_ids)
+        with torch.no_grad():
+            result = model(input_ids, token_type_ids=token_type_ids, head_mask=head_mask)
+            result = model(input_ids, token_type_ids=token_type_ids)
+            result = model(input_ids)
 
         self.parent.assertEqual(result.last_hidden_state.shape, (self.batch_size, self.seq_length, self.hidden_size))
         # past_key_values is not implemented
@@ -206,12 +185,11 @@ class GPTNeoModelTester:
         model.to(torch_device)
         model.eval()
 
-        # first forward pass
-        outputs = model(input_ids, token_type_ids=token_type_ids, use_cache=True)
-        outputs_use_cache_conf = model(input_ids, token_type_ids=token_type_ids)
-        outputs_no_past = model(input_ids, token_type_ids=token_type_ids, use_cache=False)
+        # first forward pass, `use_cache=True` comes from the config and is the same as passing it explicitly
+        with torch.no_grad():
+            outputs = model(input_ids, token_type_ids=token_type_ids)
+            outputs_no_past = model(input_ids, token_type_ids=token_type_ids, use_cache=False)
 
-        self.parent.assertTrue(len(outputs) == len(outputs_use_cache_conf))
         self.parent.assertTrue(len(outputs) == len(outputs_no_past) + 1)
 
         output, past = outputs.to_tuple()
@@ -224,10 +202,11 @@ class GPTNeoModelTester:
         next_input_ids = torch.cat([input_ids, next_tokens], dim=-1)
         next_token_type_ids = torch.cat([token_type_ids, next_token_types], dim=-1)
 
-        output_from_no_past = model(next_input_ids, token_type_ids=next_token_type_ids)["last_hidden_state"]
-        output_from_past = model(next_tokens, token_type_ids=next_token_types, past_key_values=past)[
-            "last_hidden_state"
-        ]
+        with torch.no_grad():
+            output_from_no_past = model(next_input_ids, token_type_ids=next_token_type_ids)["last_hidden_state"]
+            output_from_past = model(next_tokens, token_type_ids=next_token_types, past_key_values=past)[
+                "last_hidden_state"
+            ]
 
         # select random slice
         random_slice_idx = ids_tensor((1,), output_from_past.shape[-1]).item()
@@ -322,7 +301,8 @@ class GPTNeoModelTester:
         model.to(torch_device)
         model.eval()
 
-        result = model(input_ids, token_type_ids=token_type_ids, labels=input_ids)
+        with torch.no_grad():
+            result = model(input_ids, token_type_ids=token_type_ids, labels=input_ids)
         self.parent.assertEqual(result.loss.shape, ())
         self.parent.assertEqual(result.logits.shape, (self.batch_size, self.seq_length, self.vocab_size))
 
@@ -470,8 +450,10 @@ class GPTNeoModelTest(ModelTesterMixin, GenerationTesterMixin, PipelineTesterMix
         self.model_tester.create_and_check_gpt_neo_for_token_classification(*config_and_inputs)
 
     def test_gpt_neo_gradient_checkpointing(self):
-        config_and_inputs = self.model_tester.prepare_config_and_inputs()
-        self.model_tester.create_and_check_forward_and_backwards(*config_and_inputs, gradient_checkpointing=True)
+        # the checks only look at output shapes, so a smaller batch is enough to exercise the recomputation
+        model_tester = GPTNeoModelTester(self, batch_size=2, seq_length=4)
+        config_and_inputs = model_tester.prepare_config_and_inputs()
+        model_tester.create_and_check_forward_and_backwards(*config_and_inputs, gradient_checkpointing=True)
 
     def _get_hidden_states(self):
         return torch.tensor(
@@ -520,27 +502,45 @@ class GPTNeoModelTest(ModelTesterMixin, GenerationTesterMixin, PipelineTesterMix
 
 @require_torch
 class GPTNeoModelLanguageGenerationTest(unittest.TestCase):
-    @cached_property
+    # the 1.3B checkpoint and its tokenizer are loaded lazily (so that they are never loaded when the slow tests are
+    # skipped) and then shared by all the tests of the class instead of being re-loaded for each of them
+    _model = None
+    _tokenizer = None
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tokenizer = None
+        if cls._model is not None:
+            cls._model = None
+            backend_empty_cache(torch_device)
+
+    @property
     def model(self):
-        return GPTNeoForCausalLM.from_pretrained("EleutherAI/gpt-neo-1.3B").to(torch_device)
+        cls = type(self)
+        if cls._model is None:
+            cls._model = GPTNeoForCausalLM.from_pretrained("EleutherAI/gpt-neo-1.3B").to(torch_device)
+        return cls._model
 
-    @cached_property
+    @property
     def tokenizer(self):
-        return GPT2Tokenizer.from_pretrained("EleutherAI/gpt-neo-1.3B")
+        cls = type(self)
+        if cls._tokenizer is None:
+            cls._tokenizer = GPT2Tokenizer.from_pretrained("EleutherAI/gpt-neo-1.3B")
+        return cls._tokenizer
 
+    @parameterized.expand([("gradient_checkpointing", True), ("no_gradient_checkpointing", False)])
     @slow
-    def test_lm_generate_gpt_neo(self):
-        for checkpointing in [True, False]:
-            model = self.model
-            if checkpointing:
-                model.gradient_checkpointing_enable()
-            else:
-                model.gradient_checkpointing_disable()
-            input_ids = torch.tensor([[464, 3290]], dtype=torch.long, device=torch_device)  # The dog
-            # The dog-eared copy of the book, which is a collection of essays by the late author,
-            expected_output_ids = [464, 3290, 12, 3380, 4866, 286, 262, 1492, 11, 543, 318, 257, 4947, 286, 27126, 416, 262, 2739, 1772, 11]  # fmt: skip
-            output_ids = model.generate(input_ids, do_sample=False)
-            self.assertListEqual(output_ids[0].tolist(), expected_output_ids)
+    def test_lm_generate_gpt_neo(self, _, checkpointing):
+        model = self.model
+        if checkpointing:
+            model.gradient_checkpointing_enable()
+            # the model is shared with the other tests of the class
+            self.addCleanup(model.gradient_checkpointing_disable)
+        input_ids = torch.tensor([[464, 3290]], dtype=torch.long, device=torch_device)  # The dog
+        # The dog-eared copy of the book, which is a collection of essays by the late author,
+        expected_output_ids = [464, 3290, 12, 3380, 4866, 286, 262, 1492, 11, 543, 318, 257, 4947, 286, 27126, 416, 262, 2739, 1772, 11]  # fmt: skip
+        output_ids = model.generate(input_ids, do_sample=False)
+        self.assertListEqual(output_ids[0].tolist(), expected_output_ids)
 
     @slow
     def test_gpt_neo_sample(self):
@@ -559,12 +559,15 @@ class GPTNeoModelLanguageGenerationTest(unittest.TestCase):
     @slow
     def test_batch_generation(self):
         model = self.model
-        tokenizer = self.tokenizer
+        # the padding settings below must not leak into the shared tokenizer
+        tokenizer = copy.copy(self.tokenizer)
 
         tokenizer.padding_side = "left"
 
         # Define PAD Token = EOS Token = 50256
         tokenizer.pad_token = tokenizer.eos_token
+        # the model is shared too, so restore its config once the test is done
+        self.addCleanup(setattr, model.config, "pad_token_id", model.config.pad_token_id)
         model.config.pad_token_id = model.config.eos_token_id
 
         # use different length sentences to test batching
@@ -581,11 +584,13 @@ class GPTNeoModelLanguageGenerationTest(unittest.TestCase):
             attention_mask=inputs["attention_mask"].to(torch_device),
         )
 
-        inputs_non_padded = tokenizer(sentences[0], return_tensors="pt").input_ids.to(torch_device)
+        # the ids of each sentence on its own are the unmasked part of its row in the batch, no need to re-tokenize
+        attention_mask = inputs["attention_mask"].bool()
+        inputs_non_padded = inputs["input_ids"][0][attention_mask[0]][None].to(torch_device)
         output_non_padded = model.generate(input_ids=inputs_non_padded)
 
         num_paddings = inputs_non_padded.shape[-1] - inputs["attention_mask"][-1].long().sum().cpu().item()
-        inputs_padded = tokenizer(sentences[1], return_tensors="pt").input_ids.to(torch_device)
+        inputs_padded = inputs["input_ids"][1][attention_mask[1]][None].to(torch_device)
         output_padded = model.generate(input_ids=inputs_padded, max_length=model.config.max_length - num_paddings)
 
         batch_out_sentence = tokenizer.batch_decode(outputs, skip_special_tokens=True)
@@ -15,6 +15,7 @@
 """ Testing suite for the PyTorch PatchTST model. """
 
 import inspect
+import os
 import random
 import tempfile
 import unittest
@@ -205,14 +206,15 @@ class PatchTSTModelTest(ModelTesterMixin, PipelineTesterMixin, unittest.TestCase
         return inputs_dict
 
     def test_save_load_strict(self):
-        config, _ = self.model_tester.prepare_config_and_inputs()
-        for model_class in self.all_model_classes:
-            model = model_class(config)
+        config = self.model_tester.get_config()
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            for model_class in self.all_model_classes:
+                model = model_class(config)
 
-            with tempfile.TemporaryDirectory() as tmpdirname:
-                model.save_pretrained(tmpdirname)
-                model2, info = model_class.from_pretrained(tmpdirname, output_loading_info=True)
-            self.assertEqual(info["missing_keys"], [])
+                model_dir = os.path.join(tmpdirname, model_class.__name__)
+                model.save_pretrained(model_dir)
+                model2, info = model_class.from_pretrained(model_dir, output_loading_info=True)
+                self.assertEqual(info["missing_keys"], [])
 
     def test_hidden_states_output(self):
         def check_hidden_states_output(inputs_dict, config, model_class):
@@ -259,7 +261,7 @@ class PatchTSTModelTest(ModelTesterMixin, PipelineTesterMixin, unittest.TestCase
         self.assertEqual(PatchTSTModel.main_input_name, observed_main_input_name)
 
     def test_forward_signature(self):
-        config, _ = self.model_tester.prepare_config_and_inputs_for_common()
+        config = self.model_tester.get_config()
 
         for model_class in self.all_model_classes:
             model = model_class(config)
@@ -282,6 +282,31 @@ class EncoderDecoderMixin:
                 max_diff = np.amax(np.abs(out_1 - out_2))
                 self.assertLessEqual(max_diff, 1e-5)
 
+    def check_encoder_decoder_model_from_encoder_decoder_pretrained_torch_dtype(
+        self, config, decoder_config, **kwargs
+    ):
+        encoder_model, decoder_model = self.get_encoder_decoder_model(config, decoder_config)
+        with tempfile.TemporaryDirectory() as encoder_tmp_dirname, tempfile.TemporaryDirectory() as decoder_tmp_dirname:
+            encoder_model.save_pretrained(encoder_tmp_dirname)
+            decoder_model.save_pretrained(decoder_tmp_dirname)
+            enc_dec_model = SpeechEncoderDecoderModel.from_encoder_decoder_pretrained(
+                encoder_pretrained_model_name_or_path=encoder_tmp_dirname,
+                decoder_pretrained_model_name_or_path=decoder_tmp_dirname,
+                torch_dtype=torch.float16,
+            )
+            self.assertEqual(enc_dec_model.encoder.dtype, torch.float16)
+            self.assertEqual(enc_dec_model.decoder.dtype, torch.float16)
+
+            # the prefixed arguments take precedence
+            enc_dec_model = SpeechEncoderDecoderModel.from_encoder_decoder_pretrained(
+                encoder_pretrained_model_name_or_path=encoder_tmp_dirname,
+                decoder_pretrained_model_name_or_path=decoder_tmp_dirname,
+                torch_dtype=torch.float16,
+                decoder_torch_dtype=torch.float32,
+            )
+            self.assertEqual(enc_dec_model.encoder.dtype, torch.float16)
+            self.assertEqual(enc_dec_model.decoder.dtype, torch.float32)
+
     def check_encoder_decoder_model_output_attentions(
         self,
         config,
@@ -390,6 +415,10 @@ class EncoderDecoderMixin:
         input_ids_dict = self.prepare_config_and_inputs()
         self.check_save_and_load_encoder_decoder_model(**input_ids_dict)
 
+    def test_encoder_decoder_model_from_encoder_decoder_pretrained_torch_dtype(self):
+        input_ids_dict = self.prepare_config_and_inputs()
+        self.check_encoder_decoder_model_from_encoder_decoder_pretrained_torch_dtype(**input_ids_dict)
+
     def test_encoder_decoder_model_output_attentions(self):
         input_ids_dict = self.prepare_config_and_inputs()
         self.check_encoder_decoder_model_output_attentions(**input_ids_dict)
@@ -57,7 +57,9 @@ class MultiNodeTest(unittest.TestCase):
         smp_options = {
             "enabled": True,
             "parameters": {
-                "microbatches": 4,
+                # more microbatches than partitions shrink the pipeline bubble of the interleaved schedule, while
+                # keeping 2 samples per microbatch with per_device_train_batch_size=16
+                "microbatches": 8,
                 "placement_strategy": "spread",
                 "pipeline": "interleaved",
                 "optimize": "speed",